@@ -3,62 +3,225 @@ Advanced PMF computation methods: FFT-accelerated and Gaussian approximation
 alongside the original Yergeev method for comparison and validation
 """
 
+import functools
 import numpy as np
 import pandas as pd
+import scipy.fft
+import scipy.signal
+from scipy.stats import norm
 import time
 
+# pyFFTW is optional: when installed it becomes the scipy.fft backend, and its
+# plan cache lets repeated transforms of the same padded length reuse FFTW plans
+try:
+    import pyfftw
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(60)
+    scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    PYFFTW_AVAILABLE = True
+except ImportError:
+    PYFFTW_AVAILABLE = False
 
-def yergeev_overall_charge_distribution_internal(df, tol=1e-9):
+# Worker threads for scipy.fft calls (-1 = all cores)
+FFT_WORKERS = -1
+
+# Upper bound on complex spectrum entries transformed per batched rfft call
+# (2**20 complex128 values = 16 MB)
+FFT_BATCH_ELEMENTS = 2**20
+
+# Sites with at most this many copies are exponentiated by repeated squaring in
+# the spatial domain; above it a single FFT power is cheaper
+SPATIAL_POW_MAX_COPIES = 10
+
+# Yergeev drops leading/trailing bins below this fraction of the running peak;
+# they can only contribute mass far below the final tol cleanup
+TRIM_REL_TOL = 1e-14
+
+# Half-width of the Gaussian evaluation window, in standard deviations
+GAUSSIAN_SIGMA_SPAN = 10
+
+# Numba is optional: without it the direct kernel falls back to np.convolve
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_charges(prob_cols):
     """
-    Internal copy of Yergeev's method to avoid circular imports with Streamlit app.
+    Parse charges from column names like P(-2), P(0), P(+3); int() accepts the sign.
     
-    Compute overall charge distribution using Yergeev's iterative convolution method.
-    This is the gold-standard approach for computing discrete convolutions.
-    
-    Parameters:
-    - df: DataFrame with columns Site_ID, Copies, P(charge_states)
-    - tol: Tolerance for numerical noise
+    prob_cols must be a tuple (hashable): Streamlit reruns keep the same column
+    schema, so the parsed array is cached and returned read-only.
+    """
+    charges = np.fromiter((int(col[2:-1]) for col in prob_cols), dtype=np.int64, count=len(prob_cols))
+    charges.setflags(write=False)
+    return charges
+
+
+def _site_arrays(df, prob_cols):
+    """
+    Extract sites as contiguous arrays instead of iterating DataFrame rows.
     
     Returns:
-    - (pmf_arr, offset): Normalized probability array and charge offset
+    - probs_mat: (n_sites, n_charges) float64 matrix, each row normalized to sum 1
+      (all-zero rows are left as zeros)
+    - copies_arr: int64 copy counts; sites with missing or non-positive copies dropped
     """
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
-    charges = []
-    for col in prob_cols:
-        charge_str = col[2:-1]
-        if charge_str.startswith('+'):
-            charges.append(int(charge_str[1:]))
-        elif charge_str.startswith('-'):
-            charges.append(-int(charge_str[1:]))
-        else:
-            charges.append(int(charge_str))
+    if "Copies" in df.columns:
+        copies_arr = df["Copies"].to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        copies_arr = np.full(len(df), np.nan)
+    probs_mat = df[prob_cols].to_numpy(dtype=np.float64, na_value=0.0)
+    
+    mask = ~np.isnan(copies_arr) & (copies_arr >= 1)
+    probs_mat = probs_mat[mask]
+    copies_arr = copies_arr[mask].astype(np.int64)
+    
+    row_sums = probs_mat.sum(axis=1, keepdims=True)
+    np.divide(probs_mat, row_sums, out=probs_mat, where=row_sums > 0)
+    return probs_mat, copies_arr
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _conv1d(a, b, out):
+        """Direct full convolution of a and b accumulated into out (len(a) + len(b) - 1)."""
+        for i in range(a.size):
+            ai = a[i]
+            for j in range(b.size):
+                out[i + j] += ai * b[j]
+    
+    # Compile (or load from Numba's on-disk cache) at import, so the first
+    # Streamlit compute does not pay the JIT cost
+    _conv1d(np.ones(2), np.ones(2), np.zeros(3))
+
+
+def _convolve_direct(a, b):
+    """Full direct convolution, JIT-compiled when Numba is installed."""
+    if not NUMBA_AVAILABLE:
+        return np.convolve(a, b)
+    out = np.zeros(len(a) + len(b) - 1)
+    _conv1d(a, b, out)
+    return out
+
+
+def _convolve(a, b):
+    """
+    Full convolution using whichever of direct/FFT SciPy's heuristic predicts is faster.
+    
+    The crossover depends on both lengths, and the running PMF grows from a single
+    bin to hundreds as sites are folded in, so the choice is made per call. The FFT
+    branch uses overlap-add: the running PMF is usually much longer than the site
+    power it is convolved with, and oaconvolve then transforms short blocks instead
+    of padding both inputs to the full output length (it defers to fftconvolve
+    when the lengths are comparable).
+    """
+    if scipy.signal.choose_conv_method(a, b, mode='full', measure=False) == 'direct':
+        return _convolve_direct(a, b)
+    out = scipy.signal.oaconvolve(a, b, mode='full')
+    np.clip(out, 0.0, None, out=out)
+    return out
+
+
+def _pow_conv(pmf, k):
+    """k-fold self-convolution of pmf by binary exponentiation (about 2*log2(k) convolutions)."""
+    result = np.array([1.0])
+    base = pmf
+    while k:
+        if k & 1:
+            result = _convolve(result, base)
+        k >>= 1
+        if k:
+            base = _convolve(base, base)
+    return result
+
+
+def _convolve_power_fft(result_pmf, site_pmf, copies):
+    """
+    Convolve result_pmf with `copies` copies of site_pmf in one FFT round trip.
     
-    min_charge = min(charges)
+    The site spectrum is raised to the copies-th power pointwise, so the whole
+    chain of per-copy convolutions becomes a single rfft/irfft pair.
+    """
+    out_len = len(result_pmf) + copies * (len(site_pmf) - 1)
+    n = scipy.fft.next_fast_len(out_len, real=True)
+    R = scipy.fft.rfft(result_pmf, n, workers=FFT_WORKERS)
+    S = scipy.fft.rfft(site_pmf, n, workers=FFT_WORKERS)
+    out = scipy.fft.irfft(R * S**copies, n, workers=FFT_WORKERS)[:out_len]
+    # FFT round-off can leave tiny negative values where the PMF is zero
+    np.clip(out, 0.0, None, out=out)
+    return out
+
+
+def _yergeev_from_arrays(probs_mat, copies_arr, min_charge, tol=1e-9):
+    """Yergeev convolution on pre-extracted site arrays (see _site_arrays)."""
     result_pmf = np.array([1.0])
     result_offset = 0
     
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies <= 0:
-            continue
-        
-        site_probs = row[prob_cols].astype(float).fillna(0.0).to_numpy()
-        s = site_probs.sum()
-        if s > 0:
-            site_pmf = site_probs / s
+    for site_pmf, copies in zip(probs_mat, copies_arr):
+        copies = int(copies)
+        if copies == 1:
+            result_pmf = _convolve(result_pmf, site_pmf)
+        elif copies <= SPATIAL_POW_MAX_COPIES:
+            result_pmf = _convolve(result_pmf, _pow_conv(site_pmf, copies))
         else:
-            site_pmf = site_probs
+            result_pmf = _convolve_power_fft(result_pmf, site_pmf, copies)
+        result_offset = result_offset + copies * min_charge
         
-        site_offset = min_charge
-        for _ in range(copies):
-            result_pmf = np.convolve(result_pmf, site_pmf)
-            result_offset = result_offset + site_offset
+        # Keep the working window near the effective support instead of letting
+        # it grow with every site
+        keep = result_pmf > TRIM_REL_TOL * result_pmf.max()
+        if keep.any():
+            i0 = int(keep.argmax())
+            i1 = len(keep) - int(keep[::-1].argmax())
+            result_pmf = result_pmf[i0:i1]
+            result_offset = result_offset + i0
+    
+    s = result_pmf.sum()
+    if s > 0:
+        result_pmf = result_pmf / s
+    result_pmf[result_pmf < tol] = 0.0
+    s2 = result_pmf.sum()
+    if s2 > 0:
+        result_pmf = result_pmf / s2
+    
+    return result_pmf, result_offset
+
+
+def _fft_from_arrays(probs_mat, copies_arr, min_charge, tol=1e-9):
+    """Global FFT product on pre-extracted site arrays (see _site_arrays)."""
+    # Multiply all site spectra (each raised to its copy count) in the
+    # frequency domain, then transform back once
+    total_len = 1 + int(copies_arr.sum()) * (probs_mat.shape[1] - 1)
+    n = scipy.fft.next_fast_len(total_len, real=True)
+    
+    # Identical sites share one spectrum: merge their copy counts so each
+    # distinct PMF is transformed and exponentiated only once
+    unique_pmfs, inverse = np.unique(probs_mat, axis=0, return_inverse=True)
+    unique_copies = np.bincount(inverse.ravel(), weights=copies_arr, minlength=len(unique_pmfs))
+    
+    # Transform sites in batches: one multi-row rfft per batch lets pocketfft
+    # spread the rows over FFT_WORKERS threads, while the batch size bounds
+    # the (rows x n/2+1) complex spectra held in memory
+    unique_copies = unique_copies.astype(np.int64)
+    acc = np.ones(n // 2 + 1, dtype=np.complex128)
+    batch = max(1, FFT_BATCH_ELEMENTS // (n // 2 + 1))
+    for start in range(0, len(unique_pmfs), batch):
+        spectra = scipy.fft.rfft(unique_pmfs[start:start + batch], n, axis=1, workers=FFT_WORKERS)
+        spectra **= unique_copies[start:start + batch, None]
+        acc *= np.multiply.reduce(spectra, axis=0)
+    result_pmf = scipy.fft.irfft(acc, n, workers=FFT_WORKERS)[:total_len]
+    np.clip(result_pmf, 0.0, None, out=result_pmf)
+    result_offset = int(copies_arr.sum()) * min_charge
     
+    # Normalize and clean
     s = result_pmf.sum()
     if s > 0:
         result_pmf = result_pmf / s
+    
     result_pmf[result_pmf < tol] = 0.0
     s2 = result_pmf.sum()
     if s2 > 0:
@@ -67,11 +230,88 @@ def yergeev_overall_charge_distribution_internal(df, tol=1e-9):
     return result_pmf, result_offset
 
 
+def _gaussian_from_arrays(probs_mat, copies_arr, charges, tol=1e-9):
+    """Gaussian (CLT) approximation on pre-extracted site arrays (see _site_arrays)."""
+    min_charge = int(charges.min())
+    max_charge = int(charges.max())
+    charges = charges.astype(float)
+    
+    # Compute total mean and variance across all sites in one pass
+    site_means = probs_mat @ charges
+    site_vars = probs_mat @ (charges**2) - site_means**2
+    np.maximum(site_vars, 0.0, out=site_vars)  # E[X^2] - E[X]^2 can round below zero
+    
+    # Each copy contributes independently
+    total_mean = float(copies_arr @ site_means)
+    total_variance = float(copies_arr @ site_vars)
+    total_sites = int(copies_arr.sum())
+    
+    # Create Gaussian distribution
+    mu = total_mean
+    sigma = float(np.sqrt(total_variance))
+    
+    # Discretize to create PMF array
+    # Only mu +/- 10 sigma carries mass (tails below ~1e-23), clamped to the
+    # feasible charge range; the rest of the grid would just be underflow
+    min_possible = total_sites * min_charge
+    max_possible = total_sites * max_charge
+    lo = max(int(np.floor(mu - GAUSSIAN_SIGMA_SPAN * sigma)), min_possible)
+    hi = min(int(np.ceil(mu + GAUSSIAN_SIGMA_SPAN * sigma)), max_possible)
+    
+    offset = lo
+    
+    # Integrate the Gaussian over each unit bin [k - 0.5, k + 0.5]: differences
+    # of the CDF at the bin edges give a properly normalised discretisation
+    # even when sigma is close to 1, unlike sampling the PDF at integers
+    if sigma > 0:
+        edges = np.arange(lo - 0.5, hi + 1.5)
+        pmf = np.diff(norm.cdf(edges, loc=mu, scale=sigma))
+    else:
+        # Degenerate case: all charges are the same
+        pmf = np.zeros(hi - lo + 1)
+        closest_idx = int(np.round(mu - offset))
+        if 0 <= closest_idx < len(pmf):
+            pmf[closest_idx] = 1.0
+    
+    # Only the mass cut off by the window/feasible range is missing, so this
+    # renormalisation is a tiny correction
+    pmf = pmf / pmf.sum()
+    
+    # Clean up numerical noise
+    pmf[pmf < tol] = 0.0
+    pmf_sum = pmf.sum()
+    if pmf_sum > 0:
+        pmf = pmf / pmf_sum
+    
+    return pmf, offset
+
+
+def yergeev_overall_charge_distribution_internal(df, tol=1e-9):
+    """
+    Internal copy of Yergeev's method to avoid circular imports with Streamlit app.
+    
+    Compute overall charge distribution using Yergeev's iterative convolution method.
+    This is the gold-standard approach for computing discrete convolutions.
+    
+    Parameters:
+    - df: DataFrame with columns Site_ID, Copies, P(charge_states)
+    - tol: Tolerance for numerical noise
+    
+    Returns:
+    - (pmf_arr, offset): Normalized probability array and charge offset
+    """
+    prob_cols = [col for col in df.columns if col.startswith("P(")]
+    charges = _parse_charges(tuple(prob_cols))
+    probs_mat, copies_arr = _site_arrays(df, prob_cols)
+    return _yergeev_from_arrays(probs_mat, copies_arr, int(charges.min()), tol=tol)
+
+
 def fft_accelerated_charge_distribution(df, tol=1e-9):
     """
     Compute overall charge distribution using FFT-accelerated convolution.
     
-    Uses numpy's FFT for O(N^2 log N) complexity instead of direct convolution's O(N^3).
+    All sites are multiplied together in the frequency domain (one rfft per site,
+    one irfft in total), so no intermediate spatial PMF is ever materialized.
     Maintains exact same accuracy as Yergeev for any site count.
     
     Parameters:
@@ -85,65 +325,9 @@ def fft_accelerated_charge_distribution(df, tol=1e-9):
     start_time = time.time()
     
     prob_cols = [col for col in df.columns if col.startswith("P(")]
-    
-    # Extract charge range
-    charges = []
-    for col in prob_cols:
-        charge_str = col[2:-1]
-        if charge_str.startswith('+'):
-            charges.append(int(charge_str[1:]))
-        elif charge_str.startswith('-'):
-            charges.append(-int(charge_str[1:]))
-        else:
-            charges.append(int(charge_str))
-    
-    min_charge = min(charges)
-    max_charge = max(charges)
-    
-    # Initialize
-    result_pmf = np.array([1.0])
-    result_offset = 0
-    
-    # FFT-accelerated convolution via numpy
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies <= 0:
-            continue
-        
-        # Extract and normalize probabilities
-        site_probs = row[prob_cols].astype(float).fillna(0.0).to_numpy()
-        s = site_probs.sum()
-        if s > 0:
-            site_pmf = site_probs / s
-        else:
-            site_pmf = site_probs
-        
-        # Convolve using FFT (numpy does this internally for large arrays)
-        site_offset = min_charge
-        for _ in range(copies):
-            # numpy.convolve uses FFT internally when appropriate
-            # For our array sizes (typically < 1000), direct convolution is fine,
-            # but we pad to power of 2 for better FFT performance
-            
-            n1, n2 = len(result_pmf), len(site_pmf)
-            # Pad to next power of 2 for FFT efficiency
-            padded_size = 2 ** int(np.ceil(np.log2(n1 + n2 - 1)))
-            
-            # Use np.convolve which is optimized
-            result_pmf = np.convolve(result_pmf, site_pmf, mode='full')
-            result_offset = result_offset + site_offset
-    
-    # Normalize and clean
-    s = result_pmf.sum()
-    if s > 0:
-        result_pmf = result_pmf / s
-    
-    result_pmf[result_pmf < tol] = 0.0
-    s2 = result_pmf.sum()
-    if s2 > 0:
-        result_pmf = result_pmf / s2
+    charges = _parse_charges(tuple(prob_cols))
+    probs_mat, copies_arr = _site_arrays(df, prob_cols)
+    result_pmf, result_offset = _fft_from_arrays(probs_mat, copies_arr, int(charges.min()), tol=tol)
     
     elapsed = time.time() - start_time
     return result_pmf, result_offset, elapsed
@@ -172,82 +356,9 @@ def gaussian_approximation_charge_distribution(df, tol=1e-9):
     start_time = time.time()
     
     prob_cols = [col for col in df.columns if col.startswith("P(")]
-    
-    # Extract charge values from column names
-    charges = []
-    for col in prob_cols:
-        charge_str = col[2:-1]
-        if charge_str.startswith('+'):
-            charges.append(int(charge_str[1:]))
-        elif charge_str.startswith('-'):
-            charges.append(-int(charge_str[1:]))
-        else:
-            charges.append(int(charge_str))
-    
-    min_charge = min(charges)
-    max_charge = max(charges)
-    charges = np.array(charges, dtype=float)
-    
-    # Compute total mean and variance across all sites
-    total_mean = 0.0
-    total_variance = 0.0
-    total_sites = 0
-    
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies <= 0:
-            continue
-        
-        # Get probabilities for this site
-        site_probs = row[prob_cols].astype(float).fillna(0.0).to_numpy()
-        s = site_probs.sum()
-        if s > 0:
-            site_probs = site_probs / s
-        
-        # Compute mean and variance for this site
-        site_mean = np.dot(charges, site_probs)
-        site_var = np.dot((charges - site_mean)**2, site_probs)
-        
-        # Add contributions for each copy
-        total_mean += copies * site_mean
-        total_variance += copies * site_var
-        total_sites += copies
-    
-    # Create Gaussian distribution
-    mu = total_mean
-    sigma = np.sqrt(total_variance)
-    
-    # Discretize to create PMF array
-    # Use range from min to max charges
-    min_possible = total_sites * min_charge
-    max_possible = total_sites * max_charge
-    
-    # Create charge array
-    charges_range = np.arange(min_possible, max_possible + 1, dtype=float)
-    offset = min_possible
-    
-    # Gaussian PDF evaluated at discrete points
-    # P(z) = (1/sqrt(2*pi*sigma^2)) * exp(-(z-mu)^2 / (2*sigma^2))
-    if sigma > 0:
-        pdf_vals = (1.0 / (sigma * np.sqrt(2 * np.pi))) * np.exp(-((charges_range - mu)**2) / (2 * sigma**2))
-    else:
-        # Degenerate case: all charges are the same
-        pdf_vals = np.zeros_like(charges_range)
-        closest_idx = int(np.round(mu - offset))
-        if 0 <= closest_idx < len(pdf_vals):
-            pdf_vals[closest_idx] = 1.0
-    
-    # Normalize to PMF (sum to 1)
-    # Note: Gaussian is continuous, so we're approximating with discrete bins
-    pmf = pdf_vals / pdf_vals.sum()
-    
-    # Clean up numerical noise
-    pmf[pmf < tol] = 0.0
-    pmf_sum = pmf.sum()
-    if pmf_sum > 0:
-        pmf = pmf / pmf_sum
+    charges = _parse_charges(tuple(prob_cols))
+    probs_mat, copies_arr = _site_arrays(df, prob_cols)
+    pmf, offset = _gaussian_from_arrays(probs_mat, copies_arr, charges, tol=tol)
     
     elapsed = time.time() - start_time
     return pmf, offset, elapsed
@@ -274,14 +385,14 @@ def adaptive_charge_distribution(df, method="auto", tol=1e-9):
     Returns:
     - (pmf_arr, offset, method_used, n_copies): Results with method info
     """
+    # Extract columns and site arrays once and share them with whichever method runs
+    prob_cols = [col for col in df.columns if col.startswith("P(")]
+    charges = _parse_charges(tuple(prob_cols))
+    min_charge = int(charges.min())
+    probs_mat, copies_arr = _site_arrays(df, prob_cols)
+    
     # Count total copies (sites with multiplicity)
-    n_copies = 0
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies > 0:
-            n_copies += copies
+    n_copies = int(copies_arr.sum())
     
     # Determine best method if auto-selecting
     if method == "auto":
@@ -298,15 +409,13 @@ def adaptive_charge_distribution(df, method="auto", tol=1e-9):
     
     # Use internal Yergeev implementation to avoid circular imports with Streamlit
     if method == "yergeev":
-        start = time.time()
-        pmf, offset = yergeev_overall_charge_distribution_internal(df, tol=tol)
-        elapsed = time.time() - start
+        pmf, offset = _yergeev_from_arrays(probs_mat, copies_arr, min_charge, tol=tol)
         method_used = "Yergeev (exact)"
     elif method == "fft":
-        pmf, offset, elapsed = fft_accelerated_charge_distribution(df, tol=tol)
+        pmf, offset = _fft_from_arrays(probs_mat, copies_arr, min_charge, tol=tol)
         method_used = "FFT-Accelerated (exact)"
     elif method == "gaussian":
-        pmf, offset, elapsed = gaussian_approximation_charge_distribution(df, tol=tol)
+        pmf, offset = _gaussian_from_arrays(probs_mat, copies_arr, charges, tol=tol)
         method_used = "Gaussian Approximation"
     else:
         raise ValueError(f"Unknown method: {method}")
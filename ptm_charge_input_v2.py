@@ -3,6 +3,9 @@ ProtonPulse - PTM Charge Distribution Analyzer
 Version 2.3 | December 2025
 Developed by Valerie Le & Alex Goferman
 """
+import functools
+import hashlib
+import threading
 import time
 import numpy as np
 import pandas as pd
@@ -17,6 +20,15 @@ try:
 except ImportError:
     ADVANCED_ALGORITHMS_AVAILABLE = False
 
+# pyarrow's multi-threaded CSV reader parses uploads faster; Streamlit ships it,
+# but keep pandas' C parser as the fallback
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 # ============ PAGE CONFIG (MUST BE FIRST) ============
 st.set_page_config(
     page_title="ProtonPulse",
@@ -222,7 +234,9 @@ with st.sidebar:
     """)
 
 # ============ HELPER FUNCTIONS ============
+@functools.lru_cache(maxsize=64)
 def generate_charge_columns(min_charge, max_charge):
+    """Column names for a charge range, cached per range; returns a tuple (wrap in list() to mutate)"""
     base_cols = ["Site_ID", "Copies"]
     charge_cols = []
     for charge in range(min_charge, max_charge + 1):
@@ -232,7 +246,7 @@ def generate_charge_columns(min_charge, max_charge):
             charge_cols.append(f"P(+{charge})")
         else:
             charge_cols.append(f"P({charge})")
-    return base_cols + charge_cols
+    return tuple(base_cols + charge_cols)
 
 def index_for_charge(charge, min_charge):
     return int(charge - min_charge)
@@ -253,80 +267,153 @@ def parse_charge_from_column(col):
     else:
         return int(charge_str)
 
-def detect_charge_range_from_df(df):
+@functools.lru_cache(maxsize=64)
+def charge_range_for_columns(prob_cols):
+    """(min, max) charge for a tuple of P(...) column names, parsed once per column layout"""
+    charges = [parse_charge_from_column(col) for col in prob_cols]
+    return min(charges), max(charges)
+
+def detect_charge_range_from_df(df, prob_cols=None):
     """Detect min and max charge from dataframe columns"""
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
+    if prob_cols is None:
+        prob_cols = [col for col in df.columns if col.startswith("P(")]
     if not prob_cols:
         return -2, 2  # Default
-    charges = [parse_charge_from_column(col) for col in prob_cols]
-    return min(charges), max(charges)
+    return charge_range_for_columns(tuple(prob_cols))
 
-def yergeev_overall_charge_distribution(df, tol=1e-9):
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
-    charges = [parse_charge_from_column(col) for col in prob_cols]
-    
-    min_charge = min(charges)
+def site_matrix(df, prob_cols):
+    """Normalized per-site PMF rows and int copy counts, dropping sites with missing or non-positive copies"""
+    probs_mat = df[prob_cols].to_numpy(dtype=np.float64, na_value=0.0)
+    copies = df["Copies"].to_numpy(dtype=np.float64, na_value=0.0) if "Copies" in df.columns else np.zeros(len(df))
+    copies = copies.astype(np.int64)
+    mask = copies > 0
+    probs_mat, copies = probs_mat[mask], copies[mask]
+    row_sums = probs_mat.sum(axis=1, keepdims=True)
+    np.divide(probs_mat, row_sums, out=probs_mat, where=row_sums > 0)
+    # Rows are handed out as views (convolution_power returns them as-is for one copy); fail loudly on mutation
+    probs_mat.flags.writeable = False
+    return probs_mat, copies
+
+def row_sum_validity(df, prob_cols, tol):
+    """Per-row probability sums (NaN as 0) and whether each is within tol of 1.0"""
+    sums = df[list(prob_cols)].to_numpy(dtype=np.float64, na_value=0.0).sum(axis=1)
+    return sums, np.isclose(sums, 1.0, atol=tol)
+
+def merge_identical_sites(probs_mat, copies):
+    """Collapse sites with identical PMF rows into one row carrying their summed copies"""
+    unique_rows, inverse = np.unique(probs_mat, axis=0, return_inverse=True)
+    merged_copies = np.bincount(inverse.ravel(), weights=copies, minlength=len(unique_rows))
+    return unique_rows, merged_copies.astype(np.int64)
+
+def prune_and_renormalize(pmf, tol):
+    """Zero entries below tol (relative to the total mass) and normalize, in place on pmf (which must be a fresh float array)"""
+    # Comparing against tol * s prunes without a first normalizing pass
+    s = pmf.sum()
+    if s > 0:
+        pmf[pmf < tol * s] = 0.0
+    s2 = pmf.sum()
+    if s2 > 0:
+        pmf /= s2
+    return pmf
+
+def convolution_power(pmf, n):
+    """n-fold self-convolution of pmf by iterative binary exponentiation (~2*log2(n) np.convolve calls)"""
+    # The first set bit takes base as-is rather than convolving it with [1.0],
+    # so n == 1 (the usual copy count) returns pmf without any convolution
+    result = None
+    base = pmf
+    while n:
+        if n & 1:
+            result = base if result is None else np.convolve(result, base)
+        n >>= 1
+        if n:
+            base = np.convolve(base, base)
+    return np.array([1.0]) if result is None else result
+
+def yergeev_overall_charge_distribution(df, tol=1e-9, prob_cols=None):
+    if prob_cols is None:
+        prob_cols = [col for col in df.columns if col.startswith("P(")]
+    min_charge, max_charge = charge_range_for_columns(tuple(prob_cols))
     result_pmf = np.array([1.0])
     result_offset = 0
     
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies <= 0:
-            continue
-        
-        site_probs = row[prob_cols].astype(float).fillna(0.0).to_numpy()
-        s = site_probs.sum()
-        if s > 0:
-            site_pmf = site_probs / s
-        else:
-            site_pmf = site_probs
-        
-        site_offset = min_charge
-        for _ in range(copies):
-            result_pmf = np.convolve(result_pmf, site_pmf)
-            result_offset = result_offset + site_offset
+    # One float64 matrix for all sites instead of an iterrows Series per row;
+    # repeated patterns are exponentiated once with their combined copy count
+    probs_mat, copies_arr = merge_identical_sites(*site_matrix(df, prob_cols))
     
-    s = result_pmf.sum()
-    if s > 0:
-        result_pmf = result_pmf / s
-    result_pmf[result_pmf < tol] = 0.0
-    s2 = result_pmf.sum()
-    if s2 > 0:
-        result_pmf = result_pmf / s2
+    for site_pmf, copies in zip(probs_mat, copies_arr):
+        copies = int(copies)
+        # Drop exact-zero leading/trailing states (e.g. P(-2)=0) so they never
+        # widen the running PMF; the convolution of trimmed supports has no zero tails
+        nz = np.flatnonzero(site_pmf)
+        first = nz[0] if nz.size else 0
+        if nz.size:
+            site_pmf = site_pmf[nz[0]:nz[-1] + 1]
+        result_pmf = np.convolve(result_pmf, convolution_power(site_pmf, copies))
+        result_offset = result_offset + copies * (min_charge + int(first))
+    
+    # Return on the full feasible support so callers can compare arrays directly
+    total_copies = int(copies_arr.sum())
+    full_pmf = np.zeros(1 + total_copies * (max_charge - min_charge))
+    start = result_offset - total_copies * min_charge
+    full_pmf[start:start + len(result_pmf)] = result_pmf
+    result_pmf, result_offset = full_pmf, total_copies * min_charge
     
-    return result_pmf, result_offset
+    return prune_and_renormalize(result_pmf, tol), result_offset
 
-def enumerate_charge_combinations(df, max_combinations=100000000, timeout=30):
+def fast_fft_length(n):
+    """Smallest 2^a * 3^b * 5^c >= n; NumPy's FFT is fast on these sizes and they pad far less than the next power of two"""
+    best = 1 << max(n - 1, 0).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            m = p35
+            while m < n:
+                m *= 2
+            best = min(best, m)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+def fft_overall_charge_distribution(df, tol=1e-9, prob_cols=None):
+    """Exact distribution as one rfft product of all site spectra (NumPy only; used when advanced_algorithms is unavailable)"""
+    if prob_cols is None:
+        prob_cols = [col for col in df.columns if col.startswith("P(")]
+    min_charge, max_charge = charge_range_for_columns(tuple(prob_cols))
+    
+    probs_mat, copies = merge_identical_sites(*site_matrix(df, prob_cols))
+    
+    # Final support is bounded by the total copy count, so one transform length fits every site
+    total_len = 1 + int(copies.sum()) * (max_charge - min_charge)
+    n = fast_fft_length(total_len)
+    # All site transforms in one batched rfft, raised to their copy counts and multiplied down
+    spectra = np.fft.rfft(probs_mat, n, axis=1)
+    spectra **= copies[:, None]
+    acc = np.multiply.reduce(spectra, axis=0) if len(spectra) else np.ones(n // 2 + 1)
+    result_pmf = np.clip(np.fft.irfft(acc, n)[:total_len], 0.0, None)
+    result_offset = int(copies.sum()) * min_charge
+    
+    return prune_and_renormalize(result_pmf, tol), result_offset
+
+def enumerate_charge_combinations(df, max_combinations=100000000, timeout=30, prob_cols=None):
     start_time = time.time()
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
+    if prob_cols is None:
+        prob_cols = [col for col in df.columns if col.startswith("P(")]
     charges = [parse_charge_from_column(col) for col in prob_cols]
     
     min_charge, max_charge = min(charges), max(charges)
     
-    total_combinations = 1
-    for _, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies > 0:
-            total_combinations *= (len(prob_cols) ** copies)
+    probs_mat, copies_arr = site_matrix(df, prob_cols)
+    
+    # Every copy multiplies the search space by the number of charge states
+    total_combinations = len(prob_cols) ** int(copies_arr.sum())
     
     if total_combinations > max_combinations:
         return None, None, "unavailable"
     
     sites_data = []
-    for _, row in df.iterrows():
-        if pd.isna(row.get("Copies")):
-            continue
-        copies = int(row["Copies"])
-        if copies <= 0:
-            continue
-        probs = row[prob_cols].astype(float).fillna(0.0).to_numpy()
-        s = probs.sum()
-        if s > 0:
-            probs = probs / s
+    for probs, copies in zip(probs_mat, copies_arr):
         charge_list = np.array(charges)
         for _ in range(copies):
             sites_data.append({'charges': charge_list, 'probs': probs})
@@ -369,12 +456,79 @@ def enumerate_charge_combinations(df, max_combinations=100000000, timeout=30):
         pmf = pmf / s
     return pmf, offset, "exact"
 
+def input_digest(df, prob_cols):
+    """Content hash of the columns that feed the convolution (copies + probabilities)"""
+    cols = (["Copies"] if "Copies" in df.columns else []) + list(prob_cols)
+    data = np.ascontiguousarray(df[cols].to_numpy(dtype=np.float64, na_value=np.nan))
+    return hashlib.blake2b(data.tobytes() + repr(cols).encode(), digest_size=16).digest()
+
+# Set by compute_overall_distribution's body, which only runs on a cache miss; thread-local
+# because each session's script run has its own thread
+_compute_run = threading.local()
+
+# Key the cache on one blake2b pass over the copies/probability values; Site_ID and
+# other label columns cannot change the result, so edits to them still hit the cache
+@st.cache_data(show_spinner=False, max_entries=32,
+               hash_funcs={pd.DataFrame: lambda d: input_digest(d, [c for c in d.columns if c.startswith("P(")])})
+def compute_overall_distribution(df, prob_cols=None):
+    """Compute-tab distribution, memoized on the DataFrame contents so reruns with unchanged input skip the convolution"""
+    _compute_run.computed = True
+    if ADVANCED_ALGORITHMS_AVAILABLE:
+        pmf_arr, pmf_off, method_used, _ = adaptive_charge_distribution(df, method="auto")
+        return pmf_arr, pmf_off, method_used
+    total_copies = 0
+    if "Copies" in df.columns:
+        # One mask on the raw array instead of fillna/clip Series copies (NaN > 0 is False)
+        copies = df["Copies"].to_numpy(dtype=np.float64, na_value=np.nan)
+        total_copies = int(copies[copies > 0].sum())
+    if total_copies <= 50:
+        pmf_arr, pmf_off = yergeev_overall_charge_distribution(df, prob_cols=prob_cols)
+        return pmf_arr, pmf_off, "Yergeev"
+    # Growing per-site convolutions dominate for many copies; one FFT product is O(L log L)
+    pmf_arr, pmf_off = fft_overall_charge_distribution(df, prob_cols=prob_cols)
+    return pmf_arr, pmf_off, "FFT"
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def csv_bytes(df):
+    """UTF-8 CSV for download buttons, cached on the DataFrame contents so reruns skip re-serializing unchanged tables"""
+    return df.to_csv(index=False).encode("utf-8")
+
+def read_uploaded_csv(file):
+    """Parse an uploaded CSV with pyarrow's multi-threaded reader, falling back to pandas' C parser"""
+    if PYARROW_AVAILABLE:
+        try:
+            # Type Site_ID as a string while parsing: pandas' pyarrow engine infers it as an
+            # integer first and only then casts, so "001" would come back as "1"
+            opts = pa_csv.ConvertOptions(column_types={"Site_ID": pa.string()}, strings_can_be_null=True)
+            return pa_csv.read_csv(file, convert_options=opts).to_pandas()
+        except (pa.ArrowException, ValueError):
+            file.seek(0)  # malformed for pyarrow; let the C parser try (and report) it
+    return pd.read_csv(file, dtype={"Site_ID": str})
+
+def build_example_df(n_sites, min_charge, max_charge):
+    """Example table: every site 60% neutral / 20% at -1 and +1 (when in range), copies cycling 2, 3, 1"""
+    # All sites share one probability row, so build it once and tile it
+    probs = np.zeros(max_charge - min_charge + 1)
+    probs[neutral_index_for_range(min_charge, max_charge)] = 0.6
+    if min_charge <= -1:
+        probs[index_for_charge(-1, min_charge)] = 0.2
+    if max_charge >= 1:
+        probs[index_for_charge(1, min_charge)] = 0.2
+    
+    site_nums = np.arange(1, n_sites + 1)
+    cols = generate_charge_columns(min_charge, max_charge)
+    df = pd.DataFrame(np.tile(probs, (n_sites, 1)), columns=cols[2:])
+    df.insert(0, "Copies", site_nums % 3 + 1)
+    df.insert(0, "Site_ID", [f"Site_{i}" for i in site_nums])
+    return df
+
 def window_distribution(arr, off, low=-5, high=+5):
-    charges = np.arange(off, off + len(arr))
-    mask = (charges >= low) & (charges <= high)
-    window = pd.DataFrame({"Charge": charges[mask], "Probability": arr[mask]})
-    tail_low = arr[charges < low].sum()
-    tail_high = arr[charges > high].sum()
+    # The support is contiguous, so the window and both tails are plain slices
+    start = min(max(low - off, 0), len(arr))
+    stop = min(max(high - off + 1, start), len(arr))
+    window = pd.DataFrame({"Charge": np.arange(off + start, off + stop), "Probability": arr[start:stop]})
+    tail_low = arr[:start].sum()
+    tail_high = arr[stop:].sum()
     return window, float(tail_low), float(tail_high)
 
 def get_charge_color(charge):
@@ -390,6 +544,79 @@ def get_charge_color(charge):
     else:
         return '#9467bd'  # Purple for very positive
 
+# get_charge_color over -3..+3; every charge outside that range shares the end colors
+CHARGE_PALETTE = np.array([get_charge_color(c) for c in range(-3, 4)])
+
+def get_charge_colors(charges):
+    """Vectorized get_charge_color for an array of integer charges (one palette gather)"""
+    c = np.asarray(charges, dtype=np.int64)
+    return CHARGE_PALETTE[np.clip(c + 3, 0, len(CHARGE_PALETTE) - 1)].tolist()
+
+# Above this many charges the full-distribution chart switches from SVG bars to WebGL
+WEBGL_MIN_POINTS = 500
+
+# Figures are cached on the result tables, so reruns triggered by unrelated widgets
+# (downloads, expanders, other tabs) reuse them instead of rebuilding every trace
+@st.cache_data(show_spinner=False, max_entries=16)
+def create_combined_plots(window_df, cumulative=None):
+    """Bar chart of the -5..+5 window with its cumulative distribution underneath; pass the stored cumsum to skip recomputing it"""
+    colors = get_charge_colors(window_df['Charge'])
+    
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.6, 0.4], vertical_spacing=0.12,
+                       subplot_titles=('Probability Distribution', 'Cumulative Distribution'))
+    
+    # float32 is plenty for drawing and halves the typed arrays Plotly ships to the browser
+    fig.add_trace(go.Bar(x=window_df['Charge'], y=window_df['Probability'].to_numpy(np.float32), marker_color=colors,
+                        hovertemplate='Charge: %{x:+d}<br>P: %{y:.4f}<extra></extra>'), row=1, col=1)
+    
+    if cumulative is None:
+        cumulative = np.cumsum(window_df['Probability'].to_numpy())
+    fig.add_trace(go.Scatter(x=window_df['Charge'].values, y=cumulative, mode='lines+markers',
+                            line=dict(color='#1f77b4', width=2), marker=dict(size=5),
+                            hovertemplate='P(≤%{x:+d}): %{y:.3f}<extra></extra>'), row=2, col=1)
+    
+    fig.add_hline(y=0.5, line_dash="dash", line_color="gray", row=2, col=1)
+    fig.update_layout(height=450, showlegend=False, template='plotly_white', margin=dict(t=30, b=30))
+    fig.update_xaxes(title_text="Charge State", row=2, col=1)
+    fig.update_yaxes(title_text="Probability", row=1, col=1)
+    fig.update_yaxes(title_text="Cumulative P", row=2, col=1)
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def create_full_distribution_plot(full_df):
+    """Bar chart of every charge with non-negligible probability"""
+    full_colors = get_charge_colors(full_df['Charge'])
+    # Plot at float32 (half the browser payload); the table and CSV keep full precision
+    probs = full_df['Probability'].to_numpy(np.float32)
+    
+    fig_full = go.Figure()
+    if len(full_df) > WEBGL_MIN_POINTS:
+        # Thousands of SVG bars means thousands of DOM nodes; draw a filled WebGL trace instead
+        fig_full.add_trace(go.Scattergl(
+            x=full_df['Charge'],
+            y=probs,
+            mode='lines+markers',
+            fill='tozeroy',
+            line=dict(color='#9e9e9e', width=1),
+            marker=dict(color=full_colors, size=4),
+            hovertemplate='Charge: %{x:+d}<br>P: %{y:.6f}<extra></extra>'
+        ))
+    else:
+        fig_full.add_trace(go.Bar(
+            x=full_df['Charge'], 
+            y=probs, 
+            marker_color=full_colors,
+            hovertemplate='Charge: %{x:+d}<br>P: %{y:.6f}<extra></extra>'
+        ))
+    fig_full.update_layout(
+        height=300, 
+        template='plotly_white',
+        xaxis_title="Charge State",
+        yaxis_title="Probability",
+        margin=dict(t=20, b=40)
+    )
+    return fig_full
+
 # ============ SESSION STATE ============
 if "charge_system" not in st.session_state:
     st.session_state.charge_system = "5-state"
@@ -409,6 +636,14 @@ if "df" not in st.session_state:
 if "last_results" not in st.session_state:
     st.session_state.last_results = None
 
+# Row-sum tolerance for the "valid row" checks, shared by the Input and Compute tabs
+if "row_sum_tol" not in st.session_state:
+    st.session_state.row_sum_tol = 1e-6
+
+# Probability columns only change when a new table is loaded; scan them once per
+# rerun and let every tab reuse the tuple
+st.session_state.prob_cols = tuple(col for col in st.session_state.df.columns if col.startswith("P("))
+
 # ============ MAIN TITLE ============
 st.title("🔬 ProtonPulse")
 
@@ -563,21 +798,12 @@ with tab_input:
             
             if uploaded_file is not None:
                 try:
-                    uploaded_df = pd.read_csv(uploaded_file)
+                    uploaded_df = read_uploaded_csv(uploaded_file)
                     # Auto-detect charge range from columns
                     prob_cols_uploaded = [c for c in uploaded_df.columns if c.startswith("P(")]
                     if prob_cols_uploaded:
-                        charges = []
-                        for col in prob_cols_uploaded:
-                            charge_str = col[2:-1]
-                            if charge_str.startswith('+'):
-                                charges.append(int(charge_str[1:]))
-                            elif charge_str.startswith('-'):
-                                charges.append(-int(charge_str[1:]))
-                            else:
-                                charges.append(int(charge_str))
-                        st.session_state.min_charge = min(charges)
-                        st.session_state.max_charge = max(charges)
+                        st.session_state.min_charge, st.session_state.max_charge = \
+                            charge_range_for_columns(tuple(prob_cols_uploaded))
                     st.session_state.df = uploaded_df
                     st.session_state.last_results = None
                     st.session_state.csv_loaded = True
@@ -610,11 +836,15 @@ with tab_input:
             
             tpl_min, tpl_max = template_options[selected_template]
             template_cols = generate_charge_columns(tpl_min, tpl_max)
-            neutral = neutral_index_for_range(tpl_min, tpl_max)
-            template_probs = [0.0] * (tpl_max - tpl_min + 1)
-            template_probs[neutral] = 1.0
-            template_df = pd.DataFrame([["Site_1", 1] + template_probs], columns=template_cols)
-            template_csv = template_df.to_csv(index=False)
+            template_probs = np.zeros(tpl_max - tpl_min + 1)
+            template_probs[neutral_index_for_range(tpl_min, tpl_max)] = 1.0
+            # Column-oriented construction: each column arrives typed, no row-wise dtype inference
+            template_df = pd.DataFrame({
+                "Site_ID": ["Site_1"],
+                "Copies": np.ones(1, dtype=np.int64),
+                **{col: template_probs[k:k + 1] for k, col in enumerate(template_cols[2:])},
+            })
+            template_csv = csv_bytes(template_df)
             
             st.download_button(
                 label="⬇️ Download Template CSV",
@@ -626,19 +856,7 @@ with tab_input:
         with tpl_col2:
             st.markdown("**Quick Start Options:**")
             if st.button("📄 Load 10-site example", key="btn_quick_10"):
-                template_data = []
-                for i in range(1, 11):
-                    copies = (i % 3) + 1
-                    neutral = neutral_index_for_range(st.session_state.min_charge, st.session_state.max_charge)
-                    probs = [0.0] * (st.session_state.max_charge - st.session_state.min_charge + 1)
-                    probs[neutral] = 0.6
-                    if st.session_state.min_charge <= -1:
-                        probs[index_for_charge(-1, st.session_state.min_charge)] = 0.2
-                    if st.session_state.max_charge >= 1:
-                        probs[index_for_charge(1, st.session_state.min_charge)] = 0.2
-                    template_data.append([f"Site_{i}", copies] + probs)
-                st.session_state.df = pd.DataFrame(template_data,
-                    columns=generate_charge_columns(st.session_state.min_charge, st.session_state.max_charge))
+                st.session_state.df = build_example_df(10, st.session_state.min_charge, st.session_state.max_charge)
                 st.session_state.csv_loaded = True
                 st.session_state.last_results = None
                 st.rerun()
@@ -646,19 +864,7 @@ with tab_input:
         with tpl_col3:
             st.markdown("&nbsp;")  # Spacer
             if st.button("📄 Load 100-site example", key="btn_quick_100"):
-                template_data = []
-                for i in range(1, 101):
-                    copies = (i % 3) + 1
-                    neutral = neutral_index_for_range(st.session_state.min_charge, st.session_state.max_charge)
-                    probs = [0.0] * (st.session_state.max_charge - st.session_state.min_charge + 1)
-                    probs[neutral] = 0.6
-                    if st.session_state.min_charge <= -1:
-                        probs[index_for_charge(-1, st.session_state.min_charge)] = 0.2
-                    if st.session_state.max_charge >= 1:
-                        probs[index_for_charge(1, st.session_state.min_charge)] = 0.2
-                    template_data.append([f"Site_{i}", copies] + probs)
-                st.session_state.df = pd.DataFrame(template_data,
-                    columns=generate_charge_columns(st.session_state.min_charge, st.session_state.max_charge))
+                st.session_state.df = build_example_df(100, st.session_state.min_charge, st.session_state.max_charge)
                 st.session_state.csv_loaded = True
                 st.session_state.last_results = None
                 st.rerun()
@@ -684,7 +890,7 @@ with tab_input:
             n_states = st.session_state.max_charge - st.session_state.min_charge + 1
             st.success(f"✅ Data loaded: {len(st.session_state.df)} sites, {int(st.session_state.df['Copies'].sum())} total copies | {n_states}-state ({st.session_state.min_charge} to +{st.session_state.max_charge})")
         with header_col2:
-            csv_data = st.session_state.df.to_csv(index=False)
+            csv_data = csv_bytes(st.session_state.df)
             st.download_button(
                 label="📥 Download CSV",
                 data=csv_data,
@@ -706,21 +912,12 @@ with tab_input:
         
         with settings_col1:
             if st.button("📄 Load 100-site template", key="btn_template"):
-                template_data = []
-                for i in range(1, 101):
-                    copies = (i % 3) + 1
-                    neutral = neutral_index_for_range(st.session_state.min_charge, st.session_state.max_charge)
-                    probs = [0.0] * (st.session_state.max_charge - st.session_state.min_charge + 1)
-                    probs[neutral] = 0.6
-                    if st.session_state.min_charge <= -1:
-                        probs[index_for_charge(-1, st.session_state.min_charge)] = 0.2
-                    if st.session_state.max_charge >= 1:
-                        probs[index_for_charge(1, st.session_state.min_charge)] = 0.2
-                    template_data.append([f"Site_{i}", copies] + probs)
-                st.session_state.df = pd.DataFrame(template_data,
-                    columns=generate_charge_columns(st.session_state.min_charge, st.session_state.max_charge))
-                st.session_state.last_results = None
-                st.rerun()
+                template = build_example_df(100, st.session_state.min_charge, st.session_state.max_charge)
+                # Re-clicking with the template already loaded changes nothing; skip the full-script rerun
+                if not template.equals(st.session_state.df):
+                    st.session_state.df = template
+                    st.session_state.last_results = None
+                    st.rerun()
         
         with settings_col2:
             if st.button("🔄 Reset to default", key="btn_reset"):
@@ -752,10 +949,7 @@ with tab_input:
         # Data editor - use a cleaner approach to avoid flickering
         st.markdown("**Edit probabilities below** (each row should sum to 1.0)")
         
-        prob_cols = [col for col in st.session_state.df.columns if col.startswith("P(")]
-        
-        # Create a working copy for the editor (without computed columns)
-        editor_df = st.session_state.df.copy()
+        prob_cols = list(st.session_state.prob_cols)
         
         # Column configuration
         col_config = {
@@ -766,8 +960,9 @@ with tab_input:
             col_config[col] = st.column_config.NumberColumn(col, min_value=0.0, max_value=1.0, step=0.01, format="%.3f")
         
         # Use on_change callback to properly handle edits
+        # data_editor never mutates its input and returns a fresh frame, so no defensive copies are needed
         edited = st.data_editor(
-            editor_df,
+            st.session_state.df,
             column_config=col_config,
             num_rows="dynamic",
             hide_index=True,
@@ -776,34 +971,36 @@ with tab_input:
         )
         
         # Update session state with edited data
-        st.session_state.df = edited.copy()
+        st.session_state.df = edited
         
         # Show validation status separately (not in the editor)
         if prob_cols and len(edited) > 0:
-            sums = edited[prob_cols].sum(axis=1)
-            valid_mask = np.isclose(sums, 1.0, atol=1e-6)
-            invalid_count = sum(~valid_mask)
-            
+            sums, valid_mask = row_sum_validity(st.session_state.df, prob_cols, st.session_state.row_sum_tol)
+            # Tables are replaced, never mutated, so the Compute tab can reuse this mask by identity
+            st.session_state.row_validity = (st.session_state.df, valid_mask)
+            invalid_count = int((~valid_mask).sum())
+        
             # Show summary metrics
             val_col1, val_col2, val_col3 = st.columns(3)
             with val_col1:
                 st.metric("Total Rows", len(edited))
             with val_col2:
-                st.metric("Valid Rows", sum(valid_mask))
+                st.metric("Valid Rows", int(valid_mask.sum()))
             with val_col3:
                 if invalid_count > 0:
                     st.metric("Invalid Rows", invalid_count, delta=f"-{invalid_count}", delta_color="inverse")
                 else:
                     st.metric("Invalid Rows", 0)
-            
+        
             if invalid_count > 0:
                 st.warning(f"⚠️ {invalid_count} row(s) have Sum ≠ 1.0 (will be auto-normalized during compute)")
                 # Show which rows are invalid
                 with st.expander("Show invalid rows"):
-                    invalid_indices = np.where(~valid_mask)[0]
+                    invalid_indices = np.flatnonzero(~valid_mask)
+                    # Index the Site_ID column directly rather than materializing each row with iloc
+                    site_ids = edited["Site_ID"].to_numpy()
                     for idx in invalid_indices[:5]:  # Show first 5
-                        row_sum = sums.iloc[idx]
-                        st.write(f"Row {idx+1} (Site: {edited.iloc[idx]['Site_ID']}): Sum = {row_sum:.4f}")
+                        st.write(f"Row {idx+1} (Site: {site_ids[idx]}): Sum = {sums[idx]:.4f}")
                     if len(invalid_indices) > 5:
                         st.write(f"... and {len(invalid_indices) - 5} more")
             else:
@@ -813,8 +1010,9 @@ with tab_input:
 with tab_compute:
     st.markdown("### 📊 Compute & Visualize")
     
-    df = st.session_state.df.copy()
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
+    # Read-only here; the compute branch normalizes into its own frame
+    df = st.session_state.df
+    prob_cols = list(st.session_state.prob_cols)
     n_sites = len(df)
     total_copies = int(df['Copies'].sum()) if 'Copies' in df.columns else n_sites
     
@@ -825,8 +1023,12 @@ with tab_compute:
         st.metric("Total Copies", total_copies)
     with col3:
         if prob_cols:
-            df["_sum"] = df[prob_cols].sum(axis=1)
-            n_valid = sum(np.isclose(df["_sum"].fillna(0), 1.0, atol=1e-6))
+            cached = st.session_state.get("row_validity")
+            if cached is not None and cached[0] is df:
+                valid_mask = cached[1]
+            else:
+                valid_mask = row_sum_validity(df, prob_cols, st.session_state.row_sum_tol)[1]
+            n_valid = int(valid_mask.sum())
             if n_valid == n_sites:
                 st.success("✓ All valid")
             else:
@@ -834,59 +1036,62 @@ with tab_compute:
     
     st.markdown("---")
     
-    if st.button("🚀 Compute Distribution", type="primary", key="btn_compute"):
+    compute_clicked = st.button("🚀 Compute Distribution", type="primary", key="btn_compute")
+    input_key = input_digest(df, prob_cols) if compute_clicked else None
+    # Re-clicking with an unchanged table keeps the stored results (window, tails, full table)
+    if compute_clicked and not (st.session_state.last_results
+                                and st.session_state.last_results.get("input_key") == input_key):
         with st.spinner("Computing..."):
             try:
-                df_compute = df.copy()
+                df_compute = df
                 if prob_cols:
                     # Detect charge range from the actual data columns
-                    data_min_charge, data_max_charge = detect_charge_range_from_df(df_compute)
+                    data_min_charge, data_max_charge = detect_charge_range_from_df(df_compute, prob_cols)
                     
-                    for idx, row in df_compute.iterrows():
-                        probs = row[prob_cols].astype(float).fillna(0.0)
-                        s = probs.sum()
-                        if s <= 0:
-                            # Use detected range from data, not session state
-                            neutral_idx = neutral_index_for_range(data_min_charge, data_max_charge)
-                            probs = pd.Series(0.0, index=prob_cols)
-                            probs.iloc[neutral_idx] = 1.0
-                        else:
-                            probs = probs / s
-                        df_compute.loc[idx, prob_cols] = probs.values
+                    # Row-normalize all sites at once (float64, NaN -> 0); all-zero rows
+                    # become fully neutral, using the detected range rather than session state
+                    probs = df_compute[prob_cols].to_numpy(dtype=np.float64, na_value=0.0)
+                    sums = probs.sum(axis=1)
+                    zero = sums <= 0
+                    probs[~zero] /= sums[~zero, None]
+                    probs[zero] = 0.0
+                    probs[zero, neutral_index_for_range(data_min_charge, data_max_charge)] = 1.0
+                    df_compute = df.assign(**dict(zip(prob_cols, probs.T)))
 
-                if ADVANCED_ALGORITHMS_AVAILABLE:
-                    start = time.time()
-                    pmf_arr, pmf_off, method_used, _ = adaptive_charge_distribution(df_compute, method="auto")
-                    elapsed = time.time() - start
-                else:
-                    start = time.time()
-                    pmf_arr, pmf_off = yergeev_overall_charge_distribution(df_compute)
-                    elapsed = time.time() - start
-                    method_used = "Yergeev"
+                _compute_run.computed = False
+                start = time.time()
+                pmf_arr, pmf_off, method_used = compute_overall_distribution(df_compute, st.session_state.prob_cols)
+                elapsed = time.time() - start
+                # On a cache hit elapsed is only the lookup, so label it rather than report it as compute time
+                from_cache = not _compute_run.computed
                 
                 # Per challenge requirements: main display shows -5 to +5
                 # But also compute full distribution for those who want to see more
                 window_df, tail_low, tail_high = window_distribution(pmf_arr, pmf_off, -5, +5)
                 
-                # Also compute full distribution for expanded view
-                full_charges = np.arange(pmf_off, pmf_off + len(pmf_arr))
+                # Also compute full distribution for expanded view, keeping only
+                # non-negligible charges (filtered on the array, so no full-length frame)
+                keep = np.flatnonzero(pmf_arr > 1e-10)
                 full_df = pd.DataFrame({
-                    "Charge": full_charges,
-                    "Probability": pmf_arr
+                    "Charge": keep + pmf_off,
+                    "Probability": pmf_arr[keep]
                 })
-                # Filter out zero probabilities for cleaner display
-                full_df = full_df[full_df['Probability'] > 1e-10].reset_index(drop=True)
                 
                 st.session_state.last_results = {
                     "window_df": window_df,
+                    "cumulative": np.cumsum(window_df["Probability"].to_numpy()),
                     "full_df": full_df,
+                    # Serialized once per compute; reruns reuse the bytes instead of re-hashing full_df
+                    "full_csv": csv_bytes(full_df),
                     "tail_low": tail_low,
                     "tail_high": tail_high,
                     "elapsed": elapsed,
+                    "from_cache": from_cache,
                     "method": method_used,
                     "total_copies": total_copies,
                     "pmf_offset": pmf_off,
-                    "pmf_length": len(pmf_arr)
+                    "pmf_length": len(pmf_arr),
+                    "input_key": input_key
                 }
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -897,7 +1102,10 @@ with tab_compute:
         res = st.session_state.last_results
         window_df = res["window_df"]
         
-        st.success(f"✓ Computed in {res['elapsed']*1000:.1f} ms using {res['method']}")
+        if res.get("from_cache"):
+            st.success(f"✓ Loaded cached {res['method']} result in {res['elapsed']*1000:.1f} ms")
+        else:
+            st.success(f"✓ Computed in {res['elapsed']*1000:.1f} ms using {res['method']}")
         
         most_likely = window_df.loc[window_df['Probability'].idxmax(), 'Charge']
         peak_prob = window_df['Probability'].max()
@@ -922,25 +1130,7 @@ with tab_compute:
             st.markdown("### 📈 Distribution (Charges -5 to +5)")
             st.caption("Per challenge requirements: showing main charge range. See below for full distribution.")
             
-            colors = [get_charge_color(c) for c in window_df['Charge']]
-            
-            fig = make_subplots(rows=2, cols=1, row_heights=[0.6, 0.4], vertical_spacing=0.12,
-                               subplot_titles=('Probability Distribution', 'Cumulative Distribution'))
-            
-            fig.add_trace(go.Bar(x=window_df['Charge'], y=window_df['Probability'], marker_color=colors,
-                                hovertemplate='Charge: %{x:+d}<br>P: %{y:.4f}<extra></extra>'), row=1, col=1)
-            
-            cumulative = np.cumsum(window_df['Probability'].values)
-            fig.add_trace(go.Scatter(x=window_df['Charge'].values, y=cumulative, mode='lines+markers',
-                                    line=dict(color='#1f77b4', width=2), marker=dict(size=5),
-                                    hovertemplate='P(≤%{x:+d}): %{y:.3f}<extra></extra>'), row=2, col=1)
-            
-            fig.add_hline(y=0.5, line_dash="dash", line_color="gray", row=2, col=1)
-            fig.update_layout(height=450, showlegend=False, template='plotly_white', margin=dict(t=30, b=30))
-            fig.update_xaxes(title_text="Charge State", row=2, col=1)
-            fig.update_yaxes(title_text="Probability", row=1, col=1)
-            fig.update_yaxes(title_text="Cumulative P", row=2, col=1)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(create_combined_plots(window_df, res.get("cumulative")), use_container_width=True)
             
             # Color legend
             st.markdown("""
@@ -977,7 +1167,7 @@ with tab_compute:
             {res['method']}
             
             **Time:**  
-            {res['elapsed']*1000:.1f} ms
+            {res['elapsed']*1000:.1f} ms{" (cached)" if res.get("from_cache") else ""}
             """)
             
             with st.expander("📋 Data (-5 to +5)"):
@@ -991,35 +1181,18 @@ with tab_compute:
                 st.markdown(f"**Full range:** {int(full_df['Charge'].min()):+d} to {int(full_df['Charge'].max()):+d}")
                 
                 # Full distribution chart
-                full_colors = [get_charge_color(c) for c in full_df['Charge']]
-                
-                fig_full = go.Figure()
-                fig_full.add_trace(go.Bar(
-                    x=full_df['Charge'], 
-                    y=full_df['Probability'], 
-                    marker_color=full_colors,
-                    hovertemplate='Charge: %{x:+d}<br>P: %{y:.6f}<extra></extra>'
-                ))
-                fig_full.update_layout(
-                    height=300, 
-                    template='plotly_white',
-                    xaxis_title="Charge State",
-                    yaxis_title="Probability",
-                    margin=dict(t=20, b=40)
-                )
-                st.plotly_chart(fig_full, use_container_width=True)
+                st.plotly_chart(create_full_distribution_plot(full_df), use_container_width=True)
                 
                 # Data table
                 col_data1, col_data2 = st.columns(2)
                 with col_data1:
                     st.markdown("**Probability Table:**")
-                    # Format for display
-                    display_df = full_df.copy()
-                    display_df['Probability'] = display_df['Probability'].apply(lambda x: f"{x:.6f}")
-                    st.dataframe(display_df, hide_index=True, height=250)
+                    # Format at render time instead of copying the table into strings
+                    st.dataframe(full_df, hide_index=True, height=250,
+                                 column_config={"Probability": st.column_config.NumberColumn(format="%.6f")})
                 with col_data2:
                     # Download option
-                    csv_data = full_df.to_csv(index=False)
+                    csv_data = res.get("full_csv") or csv_bytes(full_df)
                     st.download_button(
                         label="📥 Download Full Distribution (CSV)",
                         data=csv_data,
@@ -1109,15 +1282,14 @@ with tab_validate:
     if st.button("🔍 Run Benchmark", key="btn_validate", type="primary"):
         with st.spinner("Running benchmark..."):
             try:
-                df_val = st.session_state.df.copy()
-                prob_cols = [col for col in df_val.columns if col.startswith("P(")]
+                prob_cols = list(st.session_state.prob_cols)
                 
-                # Normalize probabilities
-                for idx, row in df_val.iterrows():
-                    probs = row[prob_cols].astype(float).fillna(0.0)
-                    s = probs.sum()
-                    if s > 0:
-                        df_val.loc[idx, prob_cols] = (probs / s).values
+                # Normalize probabilities: one float64 pass (NaN -> 0), rows summing to zero left as zeros;
+                # assign() builds the working frame, so the session table is neither copied nor touched
+                probs = st.session_state.df[prob_cols].to_numpy(dtype=np.float64, na_value=0.0)
+                sums = probs.sum(axis=1, keepdims=True)
+                np.divide(probs, sums, out=probs, where=sums > 0)
+                df_val = st.session_state.df.assign(**dict(zip(prob_cols, probs.T)))
                 
                 results = {}
                 benchmark_result = None
@@ -1125,7 +1297,7 @@ with tab_validate:
                 # Run benchmark first
                 if benchmark_method == "enumeration" and can_enumerate:
                     t0 = time.time()
-                    pmf_b, off_b, status = enumerate_charge_combinations(df_val)
+                    pmf_b, off_b, status = enumerate_charge_combinations(df_val, prob_cols=prob_cols)
                     time_b = time.time() - t0
                     if pmf_b is not None and status == "exact":
                         benchmark_result = {'pmf': pmf_b, 'offset': off_b, 'time': time_b}
@@ -1133,13 +1305,13 @@ with tab_validate:
                     else:
                         # Fallback to Yergeev
                         t0 = time.time()
-                        pmf_b, off_b = yergeev_overall_charge_distribution(df_val)
+                        pmf_b, off_b = yergeev_overall_charge_distribution(df_val, prob_cols=prob_cols)
                         time_b = time.time() - t0
                         benchmark_result = {'pmf': pmf_b, 'offset': off_b, 'time': time_b}
                         results['📌 Yergeev (Benchmark)'] = benchmark_result
                 else:
                     t0 = time.time()
-                    pmf_b, off_b = yergeev_overall_charge_distribution(df_val)
+                    pmf_b, off_b = yergeev_overall_charge_distribution(df_val, prob_cols=prob_cols)
                     time_b = time.time() - t0
                     benchmark_result = {'pmf': pmf_b, 'offset': off_b, 'time': time_b}
                     results['📌 Yergeev (Benchmark)'] = benchmark_result
@@ -1147,14 +1319,14 @@ with tab_validate:
                 # Yergeev (if selected and not already benchmark)
                 if compare_yergeev and '📌 Yergeev (Benchmark)' not in results:
                     t0 = time.time()
-                    pmf_y, off_y = yergeev_overall_charge_distribution(df_val)
+                    pmf_y, off_y = yergeev_overall_charge_distribution(df_val, prob_cols=prob_cols)
                     time_y = time.time() - t0
                     results['Yergeev'] = {'pmf': pmf_y, 'offset': off_y, 'time': time_y}
                 
                 # Enumeration (if selected and feasible, and not already benchmark)
                 if compare_enum and can_enumerate and '📌 Enumeration' not in str(results.keys()):
                     t0 = time.time()
-                    pmf_e, off_e, status = enumerate_charge_combinations(df_val)
+                    pmf_e, off_e, status = enumerate_charge_combinations(df_val, prob_cols=prob_cols)
                     time_e = time.time() - t0
                     if pmf_e is not None:
                         results['Enumeration'] = {'pmf': pmf_e, 'offset': off_e, 'time': time_e}
@@ -1204,9 +1376,12 @@ with tab_validate:
                             continue
                         
                         win_other, _, _ = window_distribution(data['pmf'], data['offset'], -5, +5)
+                        # Methods may return different supports (e.g. Gaussian keeps only mu +/- 10 sigma),
+                        # so compare on the charge grid with missing charges counted as zero
+                        aligned = win_b.merge(win_other, on='Charge', how='outer', suffixes=('_b', '_o')).fillna(0.0)
                         max_diff = 0.0
-                        if len(win_b) == len(win_other):
-                            max_diff = np.max(np.abs(win_b['Probability'].values - win_other['Probability'].values))
+                        if len(aligned):
+                            max_diff = np.max(np.abs(aligned['Probability_b'].values - aligned['Probability_o'].values))
                         
                         if max_diff < 1e-10:
                             status = '🎯 PERFECT'
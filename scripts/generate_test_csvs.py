@@ -26,10 +26,34 @@ import pandas as pd
 import numpy as np
 import os
 
+# Parquet copies are optional: they need pyarrow, which Streamlit ships (the app only uses it to parse uploads)
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
 # Ensure output directory exists
 output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Data", "test_csvs")
 os.makedirs(output_dir, exist_ok=True)
 
+# Fixed probability rows: P(-2), P(-1), P(0), P(+1), P(+2)
+FIXED_PATTERNS = {
+    "neutral": [0.0, 0.0, 1.0, 0.0, 0.0],
+    "negative": [0.3, 0.4, 0.2, 0.1, 0.0],
+    "positive": [0.0, 0.1, 0.2, 0.4, 0.3],
+    "uniform": [0.2, 0.2, 0.2, 0.2, 0.2],
+}
+
+# "varied" rows, indexed by site number % 5
+VARIED_PATTERNS = np.array([
+    [0.0, 0.0, 1.0, 0.0, 0.0],    # neutral
+    [0.0, 0.2, 0.6, 0.2, 0.0],    # centered
+    [0.1, 0.2, 0.4, 0.2, 0.1],    # symmetric spread
+    [0.0, 0.3, 0.5, 0.15, 0.05],  # slight negative
+    [0.05, 0.15, 0.5, 0.3, 0.0],  # slight positive
+])
+
 def generate_csv(name, n_sites, copy_range, prob_type="varied"):
     """
     Generate a test CSV file with specified parameters.
@@ -43,46 +67,36 @@ def generate_csv(name, n_sites, copy_range, prob_type="varied"):
     if isinstance(copy_range, int):
         copy_range = (copy_range, copy_range)
     
-    rows = []
-    for i in range(1, n_sites + 1):
-        copies = np.random.randint(copy_range[0], copy_range[1] + 1)
-        
-        # Generate probabilities based on type
-        if prob_type == "neutral":
-            probs = [0.0, 0.0, 1.0, 0.0, 0.0]  # P(-2), P(-1), P(0), P(+1), P(+2)
-        elif prob_type == "negative":
-            probs = [0.3, 0.4, 0.2, 0.1, 0.0]
-        elif prob_type == "positive":
-            probs = [0.0, 0.1, 0.2, 0.4, 0.3]
-        elif prob_type == "uniform":
-            probs = [0.2, 0.2, 0.2, 0.2, 0.2]
-        elif prob_type == "random":
-            probs = np.random.random(5)
-            probs = probs / probs.sum()
-            probs = probs.tolist()
-        else:  # varied - mix of patterns
-            pattern = i % 5
-            if pattern == 0:
-                probs = [0.0, 0.0, 1.0, 0.0, 0.0]  # neutral
-            elif pattern == 1:
-                probs = [0.0, 0.2, 0.6, 0.2, 0.0]  # centered
-            elif pattern == 2:
-                probs = [0.1, 0.2, 0.4, 0.2, 0.1]  # symmetric spread
-            elif pattern == 3:
-                probs = [0.0, 0.3, 0.5, 0.15, 0.05]  # slight negative
-            else:
-                probs = [0.05, 0.15, 0.5, 0.3, 0.0]  # slight positive
-        
-        rows.append([f"Site_{i}", copies] + probs)
+    # Random draws stay per site (copies, then the "random" row) so that the
+    # seed keeps reproducing the committed Data/test_csvs
+    copies = np.empty(n_sites, dtype=np.int64)
+    random_rows = np.empty((n_sites, 5)) if prob_type == "random" else None
+    for i in range(n_sites):
+        copies[i] = np.random.randint(copy_range[0], copy_range[1] + 1)
+        if random_rows is not None:
+            random_rows[i] = np.random.random(5)
+    
+    # Generate probabilities based on type (one row per site, columns P(-2)..P(+2))
+    if prob_type in FIXED_PATTERNS:
+        probs = np.tile(FIXED_PATTERNS[prob_type], (n_sites, 1))
+    elif prob_type == "random":
+        probs = random_rows / random_rows.sum(axis=1, keepdims=True)
+    else:  # varied - mix of patterns, cycling by site number
+        probs = VARIED_PATTERNS[np.arange(1, n_sites + 1) % len(VARIED_PATTERNS)]
     
     columns = ["Site_ID", "Copies", "P(-2)", "P(-1)", "P(0)", "P(+1)", "P(+2)"]
-    df = pd.DataFrame(rows, columns=columns)
+    df = pd.DataFrame(probs, columns=columns[2:])
+    df.insert(0, "Copies", copies)
+    df.insert(0, "Site_ID", [f"Site_{i}" for i in range(1, n_sites + 1)])
     
     # Calculate total copies
     total_copies = df['Copies'].sum()
     
     filepath = os.path.join(output_dir, f"{name}.csv")
     df.to_csv(filepath, index=False)
+    if PARQUET_AVAILABLE:
+        # Typed columnar copy for loaders; skips text -> float64 parsing
+        df.to_parquet(filepath.replace(".csv", ".parquet"), engine="pyarrow", compression="snappy", index=False)
     print(f"Created: {name}.csv ({n_sites} sites, {total_copies} total copies)")
     return filepath
 
@@ -1,3 +1,6 @@
+import re
+
+
 def generate_charge_columns(min_charge, max_charge):
     base_cols = ["Site_ID", "Copies"]
     charge_cols = []
@@ -22,24 +25,15 @@ def neutral_index_for_range(min_charge, max_charge):
     return index_for_charge(candidate, min_charge)
 
 
+# Probability column names: P(-2), P(0), P(+3); int() accepts the sign directly
+_CHARGE_RE = re.compile(r"^P\(([+-]?\d+)\)$")
+
+
 def auto_detect_charge_system(df):
     if df is None or len(df) == 0:
         return "5-state", -2, 2
-    prob_cols = [col for col in df.columns if col.startswith("P(")]
-    if not prob_cols:
-        return "5-state", -2, 2
-    charges = []
-    for col in prob_cols:
-        charge_str = col[2:-1]
-        try:
-            if charge_str.startswith('+'):
-                charges.append(int(charge_str[1:]))
-            elif charge_str.startswith('-'):
-                charges.append(-int(charge_str[1:]))
-            else:
-                charges.append(int(charge_str))
-        except ValueError:
-            continue
+    # Non-matching columns (including malformed P(...) names) are skipped
+    charges = [int(m.group(1)) for col in df.columns if (m := _CHARGE_RE.match(col))]
     if not charges:
         return "5-state", -2, 2
     min_charge = min(charges)
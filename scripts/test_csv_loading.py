@@ -9,6 +9,17 @@ import sys
 # Add parent dir to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+def load_table(filepath):
+    """Read a test CSV, preferring the typed .parquet copy written next to it unless the CSV is newer."""
+    parquet_path = filepath[:-len(".csv")] + ".parquet"
+    # A hand-edited or regenerated CSV must win over a stale parquet copy
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(filepath):
+        try:
+            return pd.read_parquet(parquet_path)
+        except ImportError:
+            pass  # no parquet engine installed
+    return pd.read_csv(filepath)
+
 def test_csv_loading():
     test_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Data", "test_csvs")
     
@@ -24,7 +35,7 @@ def test_csv_loading():
     for csv_file in sorted(csv_files):
         filepath = os.path.join(test_dir, csv_file)
         try:
-            df = pd.read_csv(filepath)
+            df = load_table(filepath)
             
             # Check required columns
             required_cols = ['Site_ID', 'Copies']
@@ -86,7 +97,7 @@ def test_algorithm_adaptation():
             print(f"⚠️  {csv_file}: File not found")
             continue
             
-        df = pd.read_csv(filepath)
+        df = load_table(filepath)
         total_copies = int(df['Copies'].sum())
         
         try:
@@ -0,0 +1,140 @@
+"""
+Accuracy checks for the advanced PMF methods.
+Exact methods (Yergeev, FFT) must agree with a plain per-copy np.convolve reference.
+"""
+
+import numpy as np
+import pandas as pd
+import advanced_algorithms
+from advanced_algorithms import (
+    yergeev_overall_charge_distribution_internal,
+    fft_accelerated_charge_distribution,
+    gaussian_approximation_charge_distribution,
+)
+
+COLS = ["Site_ID", "Copies", "P(-2)", "P(-1)", "P(0)", "P(+1)", "P(+2)"]
+
+
+def reference_distribution(df):
+    """Direct per-copy convolution, the original Yergeev loop."""
+    prob_cols = [c for c in df.columns if c.startswith("P(")]
+    pmf = np.array([1.0])
+    offset = 0
+    for _, row in df.iterrows():
+        probs = row[prob_cols].astype(float).to_numpy()
+        probs = probs / probs.sum()
+        for _ in range(int(row["Copies"])):
+            pmf = np.convolve(pmf, probs)
+            offset += -2
+    return pmf / pmf.sum(), offset
+
+
+def align(pmf, offset, lo, hi):
+    """Place a (pmf, offset) pair on the charge grid lo..hi for comparison."""
+    dense = np.zeros(hi - lo + 1)
+    dense[offset - lo:offset - lo + len(pmf)] = pmf
+    return dense
+
+
+def make_multicopy_dataset():
+    return pd.DataFrame([
+        ["Site_1", 1, 0.0, 0.5, 0.5, 0.0, 0.0],
+        ["Site_2", 3, 0.0, 0.2, 0.6, 0.2, 0.0],
+        ["Site_3", 7, 0.1, 0.3, 0.4, 0.1, 0.1],
+        ["Site_4", 2, 0.2, 0.3, 0.3, 0.2, 0.0],
+        ["Site_5", 4, 0.0, 0.2, 0.6, 0.2, 0.0],  # same PMF as Site_2
+    ], columns=COLS)
+
+
+def test_exact_methods_match_reference():
+    """Yergeev and FFT should reproduce the per-copy convolution chain."""
+    df = make_multicopy_dataset()
+    pmf_ref, off_ref = reference_distribution(df)
+
+    # tol=0 keeps the tail entries the reference never prunes
+    pmf_y, off_y = yergeev_overall_charge_distribution_internal(df, tol=0.0)
+    pmf_f, off_f, _ = fft_accelerated_charge_distribution(df, tol=0.0)
+
+    lo, hi = off_ref, off_ref + len(pmf_ref) - 1
+    for name, pmf, off in [("Yergeev", pmf_y, off_y), ("FFT", pmf_f, off_f)]:
+        # Yergeev may trim negligible tails, so compare on the full charge grid
+        assert off >= lo and off + len(pmf) - 1 <= hi, f"{name} support out of range"
+        max_diff = np.max(np.abs(align(pmf, off, lo, hi) - pmf_ref))
+        print(f"{name}: max diff vs reference = {max_diff:.2e}")
+        assert max_diff < 1e-12
+        assert np.all(pmf >= 0.0)
+
+
+def test_high_copy_site():
+    """Sites above the spatial-squaring cutoff take the FFT power path."""
+    df = pd.DataFrame([
+        ["Site_1", 25, 0.1, 0.2, 0.4, 0.2, 0.1],
+        ["Site_2", 1, 0.0, 0.5, 0.5, 0.0, 0.0],
+    ], columns=COLS)
+    pmf_ref, off_ref = reference_distribution(df)
+    pmf_y, off_y = yergeev_overall_charge_distribution_internal(df, tol=0.0)
+    lo, hi = off_ref, off_ref + len(pmf_ref) - 1
+    max_diff = np.max(np.abs(align(pmf_y, off_y, lo, hi) - pmf_ref))
+    print(f"25-copy site: max diff vs reference = {max_diff:.2e}")
+    assert max_diff < 1e-12
+
+
+def test_yergeev_without_numba():
+    """The np.convolve fallback must agree with the JIT-compiled direct convolution."""
+    df = make_multicopy_dataset()
+    pmf_a, off_a = yergeev_overall_charge_distribution_internal(df)
+    saved = advanced_algorithms.NUMBA_AVAILABLE
+    advanced_algorithms.NUMBA_AVAILABLE = False
+    try:
+        pmf_b, off_b = yergeev_overall_charge_distribution_internal(df)
+    finally:
+        advanced_algorithms.NUMBA_AVAILABLE = saved
+    lo = min(off_a, off_b)
+    hi = max(off_a + len(pmf_a), off_b + len(pmf_b)) - 1
+    max_diff = np.max(np.abs(align(pmf_a, off_a, lo, hi) - align(pmf_b, off_b, lo, hi)))
+    print(f"Kernel vs fallback: max diff = {max_diff:.2e}")
+    assert max_diff < 1e-12
+
+
+def test_skips_missing_and_zero_copies():
+    """Rows with NaN/0 copies are ignored and NaN probabilities count as zero."""
+    df = make_multicopy_dataset()
+    padded = pd.concat([df, pd.DataFrame([
+        ["Empty_1", np.nan, 0.2, 0.2, 0.2, 0.2, 0.2],
+        ["Empty_2", 0, 0.2, 0.2, 0.2, 0.2, 0.2],
+    ], columns=COLS)], ignore_index=True)
+    padded.loc[0, "P(-2)"] = np.nan
+
+    pmf_a, off_a = yergeev_overall_charge_distribution_internal(df)
+    pmf_b, off_b = yergeev_overall_charge_distribution_internal(padded)
+    assert off_a == off_b
+    assert np.allclose(pmf_a, pmf_b, atol=1e-15)
+
+
+def test_gaussian_window():
+    """The Gaussian PMF covers only mu +/- 10 sigma inside the feasible range."""
+    df = pd.DataFrame([["Site_1", 2000, 0.1, 0.2, 0.4, 0.2, 0.1]], columns=COLS)
+    pmf, off, _ = gaussian_approximation_charge_distribution(df)
+    sigma = np.sqrt(2000 * 1.2)
+    assert off >= -10 * sigma - 1 and off + len(pmf) - 1 <= 10 * sigma + 1
+    assert abs(pmf.sum() - 1.0) < 1e-12
+
+
+def test_direct_convolution_kernel():
+    """The (optionally JIT-compiled) direct kernel must equal np.convolve."""
+    rng = np.random.default_rng(0)
+    a = rng.random(40)
+    b = rng.random(5)
+    out = advanced_algorithms._convolve_direct(a, b)
+    print(f"Numba available: {advanced_algorithms.NUMBA_AVAILABLE}")
+    assert np.allclose(out, np.convolve(a, b), rtol=0, atol=1e-14)
+
+
+if __name__ == "__main__":
+    test_exact_methods_match_reference()
+    test_high_copy_site()
+    test_yergeev_without_numba()
+    test_skips_missing_and_zero_copies()
+    test_gaussian_window()
+    test_direct_convolution_kernel()
+    print("ALL ADVANCED ALGORITHM TESTS PASSED")
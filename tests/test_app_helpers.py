@@ -0,0 +1,161 @@
+"""
+Checks for the helpers in ptm_charge_input_v2.
+Exact PMF paths must agree with a plain per-copy np.convolve reference.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import ptm_charge_input_v2 as app
+
+COLS = ["Site_ID", "Copies", "P(-2)", "P(-1)", "P(0)", "P(+1)", "P(+2)"]
+UPLOAD_CSV = b"Site_ID,Copies,P(-1),P(0),P(+1)\n001,2,0.2,0.6,0.2\n010,1,0.0,1.0,0.0\n"
+
+
+def reference_distribution(df):
+    """Direct per-copy convolution, the original Yergeev loop."""
+    prob_cols = [c for c in df.columns if c.startswith("P(")]
+    pmf = np.array([1.0])
+    offset = 0
+    for _, row in df.iterrows():
+        probs = row[prob_cols].astype(float).to_numpy()
+        probs = probs / probs.sum()
+        copies = 0 if pd.isna(row["Copies"]) else int(row["Copies"])
+        for _ in range(copies):
+            pmf = np.convolve(pmf, probs)
+            offset += -2
+    return pmf / pmf.sum(), offset
+
+
+def align(pmf, offset, lo, hi):
+    """Place a (pmf, offset) pair on the charge grid lo..hi for comparison."""
+    dense = np.zeros(hi - lo + 1)
+    dense[offset - lo:offset - lo + len(pmf)] = pmf
+    return dense
+
+
+def make_mixed_dataset():
+    """Repeated rows (to exercise merging), zero tails, and a zero / NaN copy count."""
+    return pd.DataFrame([
+        ["Site_1", 3, 0.1, 0.2, 0.4, 0.2, 0.1],
+        ["Site_2", 2, 0.0, 0.3, 0.5, 0.2, 0.0],
+        ["Site_3", 4, 0.1, 0.2, 0.4, 0.2, 0.1],
+        ["Site_4", 1, 0.05, 0.15, 0.6, 0.15, 0.05],
+        ["Site_5", 0, 0.5, 0.0, 0.0, 0.0, 0.5],
+        ["Site_6", np.nan, 0.0, 0.0, 0.0, 0.0, 1.0],
+    ], columns=COLS)
+
+
+def test_merge_identical_sites():
+    """Identical rows collapse into one carrying the summed copy count."""
+    probs = np.array([[0.2, 0.8], [0.5, 0.5], [0.2, 0.8]])
+    rows, copies = app.merge_identical_sites(probs, np.array([3, 1, 4]))
+    merged = {tuple(r): int(c) for r, c in zip(rows, copies)}
+    assert merged == {(0.2, 0.8): 7, (0.5, 0.5): 1}
+    assert copies.dtype == np.int64
+
+
+def test_fft_matches_reference():
+    """The batched rfft product must equal per-copy np.convolve, skipping zero and NaN copies."""
+    df = make_mixed_dataset()
+    ref, ref_off = reference_distribution(df)
+    pmf, off = app.fft_overall_charge_distribution(df, tol=0.0)
+    lo, hi = min(off, ref_off), max(off + len(pmf), ref_off + len(ref))
+    assert np.allclose(align(pmf, off, lo, hi), align(ref, ref_off, lo, hi), rtol=0, atol=1e-12)
+
+
+def test_fft_without_active_sites():
+    """With every copy count zero or missing the result is a point mass at charge 0."""
+    df = make_mixed_dataset().iloc[4:]
+    pmf, off = app.fft_overall_charge_distribution(df)
+    assert off == 0 and np.allclose(pmf, [1.0])
+
+
+def test_fast_fft_length():
+    """Lengths are 5-smooth, never shorter than n, and as short as scipy's real-FFT choice."""
+    from scipy.fft import next_fast_len
+    for n in range(1, 3000):
+        m = app.fast_fft_length(n)
+        assert m >= n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        assert m == 1, n
+        assert app.fast_fft_length(n) == next_fast_len(n, real=True)
+
+
+def test_window_distribution():
+    """Windows inside, across, outside and inverted against the support keep all mass accounted for."""
+    pmf = np.array([0.1, 0.2, 0.3, 0.4])  # charges -1..+2
+    window, low, high = app.window_distribution(pmf, -1, 0, 1)
+    assert list(window["Charge"]) == [0, 1] and np.allclose(window["Probability"], [0.2, 0.3])
+    assert np.isclose(low, 0.1) and np.isclose(high, 0.4)
+
+    window, low, high = app.window_distribution(pmf, -1, -5, 5)
+    assert list(window["Charge"]) == [-1, 0, 1, 2] and low == 0.0 and high == 0.0
+
+    # Entirely above, entirely below, and low > high: empty window, mass all in the tails
+    for (lo, hi), (exp_low, exp_high) in {(3, 5): (1.0, 0.0), (-5, -2): (0.0, 1.0), (1, 0): (0.3, 0.7)}.items():
+        window, low, high = app.window_distribution(pmf, -1, lo, hi)
+        assert window.empty and list(window.columns) == ["Charge", "Probability"]
+        assert np.isclose(low, exp_low) and np.isclose(high, exp_high), (lo, hi)
+
+
+def test_convolution_power():
+    """Binary exponentiation must equal n sequential np.convolve calls."""
+    pmf = np.array([0.1, 0.2, 0.4, 0.2, 0.1])
+    expected = np.array([1.0])
+    for n in range(13):
+        assert np.allclose(app.convolution_power(pmf, n), expected, rtol=0, atol=1e-15), n
+        expected = np.convolve(expected, pmf)
+    assert app.convolution_power(pmf, 1) is pmf
+
+
+def test_prune_tolerance_is_relative():
+    """tol is measured against the total mass, so scaling the input never changes what is pruned."""
+    base = np.array([2e-9, 0.5, 0.5 - 2e-9])
+    for scale in (1e-3, 1.0, 1e3):
+        pmf = base * scale
+        out = app.prune_and_renormalize(pmf, 1e-9)
+        assert out is pmf
+        assert np.allclose(out, base, rtol=1e-12, atol=0), scale  # 2e-9 > tol: kept
+        out = app.prune_and_renormalize(base * scale, 5e-9)
+        assert out[0] == 0.0 and np.isclose(out.sum(), 1.0), scale
+    assert np.array_equal(app.prune_and_renormalize(np.zeros(3), 1e-9), np.zeros(3))
+
+
+def test_yergeev_matches_reference():
+    """The merged, pruned Yergeev path must equal per-copy np.convolve, skipping zero and NaN copies."""
+    df = make_mixed_dataset()
+    ref, ref_off = reference_distribution(df)
+    pmf, off = app.yergeev_overall_charge_distribution(df, tol=0.0)
+    lo, hi = min(off, ref_off), max(off + len(pmf), ref_off + len(ref))
+    assert np.allclose(align(pmf, off, lo, hi), align(ref, ref_off, lo, hi), rtol=0, atol=1e-14)
+
+
+def test_upload_keeps_zero_padded_site_ids():
+    """Both the pyarrow reader and the C-parser fallback must keep Site_ID as typed."""
+    available = app.PYARROW_AVAILABLE
+    try:
+        for use_pyarrow in {available, False}:
+            app.PYARROW_AVAILABLE = use_pyarrow
+            df = app.read_uploaded_csv(io.BytesIO(UPLOAD_CSV))
+            assert list(df["Site_ID"]) == ["001", "010"], use_pyarrow
+            assert list(df["Copies"]) == [2, 1]
+            assert np.allclose(df["P(0)"], [0.6, 1.0])
+    finally:
+        app.PYARROW_AVAILABLE = available
+
+
+if __name__ == "__main__":
+    test_merge_identical_sites()
+    test_fft_matches_reference()
+    test_fft_without_active_sites()
+    test_fast_fft_length()
+    test_window_distribution()
+    test_convolution_power()
+    test_prune_tolerance_is_relative()
+    test_yergeev_matches_reference()
+    test_upload_keeps_zero_padded_site_ids()
+    print("ALL APP HELPER TESTS PASSED")